@@ -1,13 +1,72 @@
 # app.py
-from flask import Flask, request, render_template, send_file, jsonify
-import json
+from flask import Flask, request, render_template, send_file, jsonify, url_for
+from celery import Celery
+import io
+import orjson
 import os
-from utils.bedrock_utils import generate_text, generate_image
+import pybase64
+from utils.bedrock_utils import generate_text_stream, generate_image
 from utils.ppt_utils import create_ppt
-import uuid
+from utils.outline_utils import SlideStreamParser, parse_slide_list
+from utils.errors import DeckError
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import redis
 
 app = Flask(__name__)
-os.makedirs("output", exist_ok=True)
+
+REDIS_URL = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+
+# Decks are built by Celery workers: celery -A app.celery worker
+# Fixed main name so tasks register as app.* even when started with `python app.py`
+celery = Celery(
+    'app',
+    broker=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+    backend=REDIS_URL,
+)
+# finished decks live in the result backend, so let them expire instead of piling up
+celery.conf.result_expires = int(os.environ.get('CELERY_RESULT_EXPIRES', 3600))
+# report STARTED while a deck is building, so PENDING only means queued or unknown
+celery.conf.task_track_started = True
+
+PPTX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+# Shared pool for Bedrock image calls. Created once per process so concurrent
+# requests overlap their calls instead of each spinning up its own threads.
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 16))
+executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='bedrock-image')
+
+# Model outline text keyed by (topic, slides), shared by all Celery worker processes.
+# The prompt is deterministic in those two values, so repeated requests skip the model call.
+OUTLINE_CACHE_TTL = int(os.environ.get('OUTLINE_CACHE_TTL', 3600))
+outline_cache = redis.Redis.from_url(os.environ.get('OUTLINE_CACHE_URL', REDIS_URL))
+
+
+def _outline_cache_key(topic, slides):
+    return 'outline:' + hashlib.sha256(orjson.dumps([topic, slides])).hexdigest()
+
+
+def _outline_cache_get(key):
+    try:
+        text = outline_cache.get(key)
+    except redis.RedisError:
+        app.logger.warning("Outline cache unavailable; calling the model", exc_info=True)
+        return None
+    return text.decode('utf-8') if text is not None else None
+
+
+def _outline_cache_put(key, text):
+    try:
+        outline_cache.setex(key, OUTLINE_CACHE_TTL, text)
+    except redis.RedisError:
+        app.logger.warning("Outline cache unavailable; outline not cached", exc_info=True)
+
+
+IMAGE_PROMPT_STYLE = "educational infographic, flat, simple, labels, no text overlay"
+
+
+def _image_prompt(idx, s):
+    return s.get('image_prompt') or f"{s.get('title', f'Slide {idx+1}')} — {IMAGE_PROMPT_STYLE}"
 
 
 @app.route('/')
@@ -15,13 +74,16 @@ def home():
     return render_template('index.html')
 
 
-@app.route('/generate', methods=['POST'])
-def generate():
-    topic = request.form.get('topic', '').strip()
-    slides = int(request.form.get('slides', 5))
-
-    if not topic:
-        return "Please provide a topic", 400
+@celery.task(name='app.build_deck')
+def build_deck(topic, slides, nocache=False):
+    """
+    Generate the outline and slide images for `topic` and build the deck.
+    Runs on a Celery worker; returns {'pptx': <base64 pptx>, 'warning': str or None}
+    so the deck can travel through the result backend without touching disk.
+    """
+    # nocache forces a fresh outline from the model
+    cache_key = _outline_cache_key(topic, slides)
+    cached = None if nocache else _outline_cache_get(cache_key)
 
     # Create outline — force strict JSON-only output from the model
     prompt = f"""
@@ -39,64 +101,105 @@ Return ONLY a valid JSON array (no extra text) with this structure:
 Topic: {topic}
 Keep each title short (6-8 words) and each bullets array max 5 items.
 """
+    # Stream the outline and start each slide's image as soon as its object is complete,
+    # so image generation overlaps with the rest of the text generation
+    parser = SlideStreamParser()
+    data = []
+    futures = []
     try:
-        outline_text = generate_text(prompt)
+        # ~200 tokens per slide keeps a full deck well clear of the max_tokens cut-off
+        fragments = [cached] if cached is not None else generate_text_stream(prompt, max_tokens=max(800, 200 * slides))
+        for frag in fragments:
+            for s in parser.feed(frag):
+                futures.append(executor.submit(generate_image, _image_prompt(len(data), s)))
+                data.append(s)
     except Exception as e:
+        for fut in futures:
+            fut.cancel()
         app.logger.exception("Text generation failed")
-        return f"Text generation failed: {e}", 500
-
-    # parse JSON robustly (in case model returned surrounding text)
-    try:
-        data = json.loads(outline_text)
-    except Exception:
-        # try to extract first JSON array found in text
-        start = outline_text.find('[')
-        end = outline_text.rfind(']')
-        if start != -1 and end != -1 and end > start:
-            try:
-                data = json.loads(outline_text[start:end+1])
-            except Exception as e:
-                app.logger.exception("Failed to parse JSON from model output")
-                return f"Failed to parse model output as JSON: {e}", 500
-        else:
-            app.logger.error("No JSON array found in model output")
-            return "Model did not return a JSON array. Inspect logs.", 500
-
-    # Validate data is a list
-    if not isinstance(data, list):
-        return "Model output is not a list of slides", 500
-
-    # Generate 1 image per slide
-    for idx, s in enumerate(data):
-        title = s.get('title', f'Slide {idx+1}')
-        img_prompt = s.get('image_prompt') or f"{title} — educational infographic, flat, simple, labels, no text overlay"
+        raise DeckError("Text generation failed. Please try again.") from e
+
+    warning = None
+    if data and not parser.closed:
+        # the stream stopped mid-array (usually max_tokens); keep the finished slides but say so
+        app.logger.warning("Outline for %r was cut off after %d of %d slides", topic, len(data), slides)
+        warning = f"The model's answer was cut off; the deck has {len(data)} of {slides} slides."
+
+    if not data:
+        outline_text = parser.text
+
+        # parse JSON robustly (in case model returned surrounding text)
+        data = parse_slide_list(outline_text)
+        if data is None:
+            app.logger.error("No JSON array of slide objects found in model output: %r", outline_text[:500])
+            raise DeckError("Model did not return a JSON array of slides. Please try again.")
+
+        # Generate 1 image per slide — the Bedrock calls are independent, so run them concurrently
+        prompts = [_image_prompt(i, s) for i, s in enumerate(data)]
+        futures = [executor.submit(generate_image, p) for p in prompts]
+
+    # only cache complete outlines; a response cut off at max_tokens still yields
+    # the slides that finished, and must not be served again as the whole deck
+    # a hit is not re-stored, so entries really do expire OUTLINE_CACHE_TTL after the model call
+    if cached is None and len(data) == slides:
+        _outline_cache_put(cache_key, parser.text)
+
+    for idx, (s, fut) in enumerate(zip(data, futures)):
         try:
-            img_bytes = generate_image(img_prompt)
+            s['image_bytes'] = fut.result()
         except Exception as e:
-            app.logger.exception("Image generation failed for slide %s", title)
+            app.logger.exception("Image generation failed for slide %s", s.get('title', f'Slide {idx+1}'))
             # continue without image instead of failing entire job
-            s['image_path'] = None
-            continue
-
-        img_path = f"output/{uuid.uuid4().hex}.png"
-        try:
-            with open(img_path, 'wb') as f:
-                f.write(img_bytes)
-            s['image_path'] = img_path
-        except Exception as e:
-            app.logger.exception("Failed saving image to disk")
-            s['image_path'] = None
+            s['image_bytes'] = None
 
     # Create PPT
     try:
-        ppt_path = create_ppt(data)
+        buf = create_ppt(data)
     except Exception as e:
         app.logger.exception("Failed to create PPT")
-        return f"Failed to create PPT: {e}", 500
+        raise DeckError("Failed to create PPT. Please try again.") from e
+
+    return {'pptx': pybase64.b64encode(buf.getvalue()).decode('ascii'), 'warning': warning}
+
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    topic = request.form.get('topic', '').strip()
+    slides = int(request.form.get('slides', 5))
+
+    if not topic:
+        return "Please provide a topic", 400
+
+    # queue the job and return immediately; clients poll /status/<job_id>
+    job = build_deck.delay(topic, slides, request.values.get('nocache') == '1')
+    return jsonify(job_id=job.id, status_url=url_for('status', job_id=job.id)), 202
+
+
+@app.route('/status/<job_id>')
+def status(job_id):
+    job = build_deck.AsyncResult(job_id)
+    body = {'job_id': job.id, 'state': job.state}
+    if job.failed():
+        # only DeckError messages are meant for users; anything else stays in the worker logs
+        if isinstance(job.result, DeckError):
+            body['error'] = str(job.result)
+        else:
+            body['error'] = "Something went wrong while building the presentation. Please try again."
+    elif job.successful():
+        body['download_url'] = url_for('download', job_id=job.id)
+        body['warning'] = job.result.get('warning')
+    return jsonify(body)
+
 
-    return send_file(ppt_path, as_attachment=True)
+@app.route('/download/<job_id>')
+def download(job_id):
+    job = build_deck.AsyncResult(job_id)
+    if not job.successful():
+        return "Presentation is not ready", 404
+    buf = io.BytesIO(pybase64.b64decode(job.result['pptx']))
+    return send_file(buf, as_attachment=True, download_name='deck.pptx', mimetype=PPTX_MIMETYPE)
 
 
 if __name__ == '__main__':
-    # production: remove debug=True
+    # development only; for production run: gunicorn -c gunicorn.conf.py wsgi:app
     app.run(host='0.0.0.0', port=5000, debug=True)
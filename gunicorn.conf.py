@@ -0,0 +1,12 @@
+# gunicorn.conf.py
+# Threaded workers: web requests only enqueue jobs and poll status, so threads stay free;
+# the slow Bedrock work runs on the Celery workers (celery -A app.celery worker).
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+# requests are short now, but downloads of large decks can still take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
@@ -0,0 +1,76 @@
+from utils.outline_utils import SlideStreamParser, parse_slide_list
+
+
+def _feed_all(text, size=3):
+    parser = SlideStreamParser()
+    slides = []
+    for i in range(0, len(text), size):
+        slides.extend(parser.feed(text[i:i + size]))
+    return parser, slides
+
+
+def test_yields_objects_across_fragment_boundaries():
+    text = '[{"title": "A", "bullets": ["x"]}, {"title": "B", "bullets": []}]'
+    parser, slides = _feed_all(text)
+    assert slides == [{'title': 'A', 'bullets': ['x']}, {'title': 'B', 'bullets': []}]
+    assert parser.closed
+    assert parser.text == text
+
+
+def test_escaped_quotes_and_brackets_inside_strings():
+    text = r'[{"title": "Say \"hi\" [now]", "bullets": ["a]b", "c}{d", "back\\"]}]'
+    parser, slides = _feed_all(text)
+    assert slides == [{'title': 'Say "hi" [now]', 'bullets': ['a]b', 'c}{d', 'back\\']}]
+    assert parser.closed
+
+
+def test_skips_prose_before_the_array():
+    text = 'Here are [5] slides: [{"title": "A"}, {"title": "B"}] hope [that] helps'
+    parser, slides = _feed_all(text)
+    assert slides == [{'title': 'A'}, {'title': 'B'}]
+    assert parser.closed
+
+
+def test_array_inside_wrapper_object():
+    parser, slides = _feed_all('{"slides": [{"title": "Z"}]}')
+    assert slides == [{'title': 'Z'}]
+    assert parser.closed
+
+
+def test_truncated_stream_keeps_finished_slides_and_stays_open():
+    parser, slides = _feed_all('[{"title": "A", "bullets": ["x"]}, {"title": "B", "bull')
+    assert slides == [{'title': 'A', 'bullets': ['x']}]
+    assert not parser.closed
+
+
+def test_no_array_yields_nothing():
+    parser, slides = _feed_all('Sorry, I cannot help with that.')
+    assert slides == []
+    assert not parser.closed
+
+
+def test_ignores_input_after_close():
+    parser = SlideStreamParser()
+    assert parser.feed('[{"title": "A"}]') == [{'title': 'A'}]
+    assert parser.feed(' [{"title": "B"}]') == []
+    assert parser.text == '[{"title": "A"}] [{"title": "B"}]'
+
+
+def test_parse_slide_list_whole_text():
+    assert parse_slide_list('[{"title": "A", "bullets": ["x"]}]') == [{'title': 'A', 'bullets': ['x']}]
+
+
+def test_parse_slide_list_skips_non_slide_arrays():
+    text = 'Here are [5] slides: [{"title": "A", "bullets": ["a", "b"]}] enjoy'
+    assert parse_slide_list(text) == [{'title': 'A', 'bullets': ['a', 'b']}]
+
+
+def test_parse_slide_list_inside_wrapper_object():
+    assert parse_slide_list('{"slides": [{"title": "Z"}]}') == [{'title': 'Z'}]
+
+
+def test_parse_slide_list_rejects_non_slides():
+    assert parse_slide_list('[1, 2, 3]') is None
+    assert parse_slide_list('[]') is None
+    assert parse_slide_list('no json here') is None
+    assert parse_slide_list('[{"title": "A", "bull') is None
@@ -0,0 +1,24 @@
+from pptx import Presentation
+
+from utils.ppt_utils import create_ppt
+
+
+def _body_paragraphs(buf):
+    slide = Presentation(buf).slides[0]
+    body = [sh for sh in slide.placeholders if sh.has_text_frame][0]
+    return [p.text for p in body.text_frame.paragraphs]
+
+
+def test_control_characters_are_escaped():
+    buf = create_ppt([{'title': 'T', 'bullets': ['bad\x01ctrl', 'tab\there\x0b']}])
+    assert _body_paragraphs(buf) == ['bad_x0001_ctrl', 'tab\there_x000B_']
+
+
+def test_newlines_split_into_paragraphs():
+    buf = create_ppt([{'title': 'T', 'bullets': ['one\ntwo', 'three\r\nfour']}])
+    assert _body_paragraphs(buf) == ['one', 'two', 'three', 'four']
+
+
+def test_empty_bullets_keep_a_paragraph():
+    buf = create_ppt([{'title': 'T', 'bullets': []}])
+    assert _body_paragraphs(buf) == ['']
@@ -1,90 +1,210 @@
 # utils/bedrock_utils.py
 import boto3
-import json
-import base64
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.config import Config
+import httpx
+import orjson
+import pybase64
+import io
 import os
+import random
+import re
+import threading
+import time
 import logging
+from urllib.parse import quote
+from typing import Optional
+from PIL import Image
 
 # Use certifi certificate bundle to avoid Windows/Anaconda SSL issues
 # boto3.client accepts 'verify' param which can be a path to a CA bundle
 REGION = os.environ.get('AWS_REGION', 'ap-south-1')
-TEXT_MODEL = os.environ.get('BEDROCK_TEXT_MODEL', 'anthropic.claude-3-haiku-20240307-v1')
+TEXT_MODEL = os.environ.get('BEDROCK_TEXT_MODEL', 'anthropic.claude-3-haiku-20240307-v1:0')
+# 'optimized' requests latency-optimized inference for the text model; set to 'standard' to opt out
+TEXT_LATENCY = os.environ.get('BEDROCK_LATENCY', 'optimized')
 IMAGE_MODEL = os.environ.get('BEDROCK_IMAGE_MODEL', 'amazon.titan-image-generator-v1')
+# Slides show images ~4in wide, so generated PNGs are re-encoded as JPEG to keep decks small
+JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 82))
 
-# Create bedrock client with explicit cert bundle
-bedrock = boto3.client('bedrock-runtime', region_name=REGION,)
+# Image calls go over the HTTP/2 client below; its pool is sized above the app's image
+# worker count so concurrent calls reuse kept-alive connections instead of re-handshaking.
+MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', 32))
+MAX_ATTEMPTS = 3
+
+# The boto3 client only carries the streamed outline call, one per deck, so botocore's
+# default connection pool is plenty; adaptive retries cover starting the stream.
+BEDROCK_CONFIG = Config(
+    retries={'max_attempts': MAX_ATTEMPTS, 'mode': 'adaptive'},
+    read_timeout=120,
+    connect_timeout=10,
+    tcp_keepalive=True,
+)
+
+# Image InvokeModel calls are signed with SigV4 and sent over one shared HTTP/2 client, so
+# concurrent image calls multiplex over a single TLS connection
+RUNTIME_ENDPOINT = f"https://bedrock-runtime.{REGION}.amazonaws.com"
+http = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_connections=MAX_POOL_CONNECTIONS, max_keepalive_connections=MAX_POOL_CONNECTIONS),
+    timeout=httpx.Timeout(120, connect=10),
+)
+
+# The boto3 client and AWS credentials are resolved on first use, not at import: on hosts
+# without static keys that can block on instance metadata, and web workers never need them.
+_bedrock = None
+_credentials = None
+_lazy_lock = threading.Lock()
+
+# throttling, transient server errors and transport errors are retried
+_RETRY_STATUS = {429, 500, 502, 503, 504}
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# rough check for a long base64-looking string
+_B64_RE = re.compile(r'[A-Za-z0-9+/=\s]{200,}')
 
-def _read_body(resp):
+
+def _bedrock_client():
+    global _bedrock
+    if _bedrock is None:
+        with _lazy_lock:
+            if _bedrock is None:
+                _bedrock = boto3.client('bedrock-runtime', region_name=REGION, config=BEDROCK_CONFIG)
+    return _bedrock
+
+
+def _get_credentials():
     """
-    Utility to decode response body bytes safely.
+    Return the process's AWS credentials, resolving them on first use. A failed lookup
+    is not cached, so the next call tries again instead of needing a restart.
     """
-    body_bytes = resp['body'].read()
-    try:
-        return body_bytes.decode('utf-8')
-    except Exception:
-        # fallback: try latin1
-        return body_bytes.decode('latin1', errors='ignore')
+    global _credentials
+    if _credentials is None:
+        with _lazy_lock:
+            if _credentials is None:
+                _credentials = boto3.Session().get_credentials()
+    if _credentials is None:
+        raise RuntimeError("No AWS credentials found for Bedrock")
+    return _credentials
+
+
+def _invoke(model_id, body):
+    """
+    Send a SigV4-signed InvokeModel request and return the raw response body bytes.
+    """
+    credentials = _get_credentials()
+    url = f"{RUNTIME_ENDPOINT}/model/{quote(model_id, safe='')}/invoke"
+    req_headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        # sign per attempt: signatures are time-bound and credentials may refresh
+        req = AWSRequest(method='POST', url=url, data=body, headers=req_headers)
+        SigV4Auth(credentials.get_frozen_credentials(), 'bedrock', REGION).add_auth(req)
+        try:
+            resp = http.post(url, content=body, headers=dict(req.headers.items()))
+        except httpx.TransportError:
+            # timeouts, connect errors and HTTP/2 GOAWAY/protocol errors are transient
+            if last_attempt:
+                raise
+            log.warning("Bedrock InvokeModel %s transport error, retrying", model_id, exc_info=True)
+        else:
+            if resp.status_code not in _RETRY_STATUS or last_attempt:
+                break
+        time.sleep(min(8, 0.5 * 2 ** attempt) * random.uniform(0.5, 1))
+
+    if resp.status_code >= 400:
+        raise RuntimeError(f"Bedrock InvokeModel {model_id} failed ({resp.status_code}): {resp.text}")
+    return resp.content
 
 
 # ---------- TEXT ----------
-def generate_text(prompt, max_tokens=800):
+def generate_text_stream(prompt, max_tokens=800):
     """
-    Call Bedrock text model and return the model text output (string).
-    Tries to handle a few common bedrock response shapes.
+    Stream the Bedrock text model output. Yields text fragments as they arrive,
+    so callers can start work on the beginning of the answer before it is complete.
     """
     body = {
         "messages": [{"role": "user", "content": prompt}],
         "max_tokens": max_tokens
     }
 
+    kwargs = {}
+    if TEXT_LATENCY in ('standard', 'optimized'):
+        kwargs['performanceConfigLatency'] = TEXT_LATENCY
+
     try:
-        resp = bedrock.invoke_model(modelId=TEXT_MODEL, body=json.dumps(body), contentType='application/json')
+        resp = _bedrock_client().invoke_model_with_response_stream(modelId=TEXT_MODEL, body=orjson.dumps(body), contentType='application/json', **kwargs)
     except Exception as e:
-        log.exception("Bedrock invoke_model (text) failed")
+        log.exception("Bedrock invoke_model_with_response_stream (text) failed")
         raise
 
-    raw = _read_body(resp)
+    for event in resp['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        try:
+            parsed = orjson.loads(chunk['bytes'])
+        except orjson.JSONDecodeError:
+            continue
+        if not isinstance(parsed, dict):
+            continue
+        # Anthropic-like: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "..."}}
+        delta = parsed.get('delta')
+        if isinstance(delta, dict) and isinstance(delta.get('text'), str):
+            yield delta['text']
+            continue
+        # Amazon / Meta style chunks
+        for key in ('outputText', 'generation', 'completion'):
+            if isinstance(parsed.get(key), str):
+                yield parsed[key]
+                break
+
 
-    # Try parse as JSON
+# ---------- IMAGE ----------
+def _decode_image(b64):
+    """
+    Decode a base64 image and re-encode it as JPEG. Returns the decoded bytes
+    unchanged if Pillow cannot read them.
+    """
+    if isinstance(b64, str):
+        # orjson yields str; decode from ASCII bytes once instead of inside b64decode
+        b64 = b64.encode('ascii')
+    img_bytes = pybase64.b64decode(b64)
     try:
-        parsed = json.loads(raw)
+        img = Image.open(io.BytesIO(img_bytes))
+        buf = io.BytesIO()
+        img.convert('RGB').save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        return buf.getvalue()
     except Exception:
-        # Not JSON — return raw text
-        return raw
+        log.warning("Could not re-encode image as JPEG; keeping original bytes")
+        return img_bytes
 
-    # parsed is JSON — handle common formats:
-    # 1) { "content": [ { "type": "output_text", "text": "..." } ] }
-    if isinstance(parsed, dict):
-        # Anthropic-like
-        if 'content' in parsed and isinstance(parsed['content'], list):
-            first = parsed['content'][0]
-            # some shapes: {'type': 'output_text', 'text': '...'}
-            if isinstance(first, dict):
-                if 'text' in first:
-                    return first['text']
-                # sometimes nested differently
-                if 'content' in first:
-                    return first['content']
-        # Amazon-style: {"output": "text..."} or other keys
-        if 'output' in parsed and isinstance(parsed['output'], str):
-            return parsed['output']
-        # if there's a top-level 'message' or similar
-        for key in ('message', 'text', 'response'):
-            if key in parsed and isinstance(parsed[key], str):
-                return parsed[key]
-
-    # If none matched, return stringified JSON
-    return json.dumps(parsed)
 
+def _find_b64(obj: object) -> Optional[str]:
+    """
+    Depth-first search for the first base64-looking string in a parsed JSON tree.
+    Uses an explicit stack rather than recursion to avoid per-node frame setup.
+    """
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, str):
+            if _B64_RE.fullmatch(cur):
+                return cur
+        elif isinstance(cur, dict):
+            # reversed so children are visited in their original order
+            stack.extend(reversed(cur.values()))
+        elif isinstance(cur, list):
+            stack.extend(reversed(cur))
+    return None
 
-# ---------- IMAGE ----------
-def generate_image(prompt, width=1024, height=1024, num_images=1):
+
+def generate_image(prompt, width=512, height=512, num_images=1):
     """
-    Call Bedrock image model. Return raw image bytes for the first image.
+    Call Bedrock image model. Return JPEG image bytes for the first image.
     Handles a few common response formats (base64 string, dict with b64_json, etc.)
     """
     # A flexible image-generation request body to fit various Titan/stability shapes
@@ -106,20 +226,18 @@ def generate_image(prompt, width=1024, height=1024, num_images=1):
     }
 
     try:
-        resp = bedrock.invoke_model(modelId=IMAGE_MODEL, body=json.dumps(body), contentType='application/json')
+        raw = _invoke(IMAGE_MODEL, orjson.dumps(body))
     except Exception as e:
         log.exception("Bedrock invoke_model (image) failed")
         raise
 
-    raw = _read_body(resp)
-
     # Try parse JSON
     try:
-        parsed = json.loads(raw)
-    except Exception:
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError:
         # not JSON — maybe raw base64
         try:
-            return base64.b64decode(raw)
+            return _decode_image(raw)
         except Exception:
             raise ValueError("Image response is neither JSON nor base64")
 
@@ -131,7 +249,7 @@ def generate_image(prompt, width=1024, height=1024, num_images=1):
             b64 = parsed['images'][0]
             if isinstance(b64, dict) and 'b64_json' in b64:
                 b64 = b64['b64_json']
-            return base64.b64decode(b64)
+            return _decode_image(b64)
         # some models return 'artifacts'
         if 'artifacts' in parsed and isinstance(parsed['artifacts'], list) and parsed['artifacts']:
             art = parsed['artifacts'][0]
@@ -139,29 +257,12 @@ def generate_image(prompt, width=1024, height=1024, num_images=1):
             if isinstance(art, dict):
                 for k in ('b64_json', 'base64', 'data'):
                     if k in art:
-                        return base64.b64decode(art[k])
+                        return _decode_image(art[k])
             if isinstance(art, str):
-                return base64.b64decode(art)
+                return _decode_image(art)
     # fallback: try to find a base64-looking string anywhere
-    def find_b64(obj):
-        if isinstance(obj, str):
-            # rough check: long string with base64 chars
-            if len(obj) > 200 and all(c.isalnum() or c in '+/=\n' for c in obj):
-                return obj
-        if isinstance(obj, dict):
-            for v in obj.values():
-                res = find_b64(v)
-                if res:
-                    return res
-        if isinstance(obj, list):
-            for it in obj:
-                res = find_b64(it)
-                if res:
-                    return res
-        return None
-
-    candidate = find_b64(parsed)
+    candidate = _find_b64(parsed)
     if candidate:
-        return base64.b64decode(candidate)
+        return _decode_image(candidate)
 
     raise ValueError("Could not parse image bytes from model response")
@@ -0,0 +1,7 @@
+# utils/errors.py
+# Kept out of app.py so the class has the same import path in the web and worker
+# processes, which lets Celery rebuild it from the result backend either way.
+
+
+class DeckError(Exception):
+    """Raised by build_deck with a message that is safe to show to the user."""
@@ -0,0 +1,105 @@
+# utils/outline_utils.py
+import orjson
+import re
+
+# A JSON array allowing one level of nested arrays (the slide objects' bullets)
+_JSON_ARRAY_RE = re.compile(r'\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]', re.DOTALL)
+
+
+def _is_slide_list(data):
+    return isinstance(data, list) and bool(data) and all(isinstance(s, dict) for s in data)
+
+
+def parse_slide_list(text):
+    """
+    Return the slide list from a complete model response, or None if there is none.
+    Tries the whole text first, then each bracketed span in order, and takes the first
+    that is a non-empty list of objects, so prose like "[5] slides" is passed over.
+    """
+    try:
+        data = orjson.loads(text)
+        if _is_slide_list(data):
+            return data
+    except orjson.JSONDecodeError:
+        pass
+    for m in _JSON_ARRAY_RE.finditer(text):
+        try:
+            data = orjson.loads(m.group(0))
+        except orjson.JSONDecodeError:
+            continue
+        if _is_slide_list(data):
+            return data
+    return None
+
+
+class SlideStreamParser:
+    """
+    Incrementally pull slide objects out of a streamed model response.
+
+    feed() returns the objects of the first JSON array that contains any, as soon as
+    each closing brace arrives. Bracketed prose before it (e.g. "[5] slides") is skipped.
+    `closed` turns True once that array's closing bracket is seen; if the stream ends
+    while it is still False after yielding slides, the output was cut off.
+    `text` is the full response received so far.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+        self._buf = None
+        self._found = 0
+        self.closed = False
+
+    @property
+    def text(self):
+        return ''.join(self._parts)
+
+    def feed(self, frag):
+        self._parts.append(frag)
+        out = []
+        if self.closed:
+            return out
+
+        depth, in_str, escaped, buf = self._depth, self._in_str, self._escaped, self._buf
+        for ch in frag:
+            if buf is not None:
+                buf.append(ch)
+            if in_str:
+                if escaped:
+                    escaped = False
+                elif ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_str = False
+                continue
+            if depth == 0:
+                # skip any text before the array; only '[' opens it
+                if ch == '[':
+                    depth = 1
+                continue
+            if ch == '"':
+                in_str = True
+            elif ch in '[{':
+                if depth == 1 and ch == '{':
+                    buf = ['{']
+                depth += 1
+            elif ch in ']}':
+                depth -= 1
+                if depth == 1 and buf is not None:
+                    try:
+                        obj = orjson.loads(''.join(buf))
+                    except orjson.JSONDecodeError:
+                        obj = None
+                    buf = None
+                    if isinstance(obj, dict):
+                        self._found += 1
+                        out.append(obj)
+                elif depth == 0 and self._found:
+                    self.closed = True
+                    break
+                # an array with no slide objects was prose; keep looking for the real one
+
+        self._depth, self._in_str, self._escaped, self._buf = depth, in_str, escaped, buf
+        return out
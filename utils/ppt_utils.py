@@ -1,30 +1,64 @@
 # utils/ppt_utils.py
+import pptx
 from pptx import Presentation
+from pptx.oxml.ns import qn
 from pptx.util import Inches
-import os, uuid
+from lxml import etree
+import io
+import os
+import re
 import logging
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-OUTPUT_DIR = "output"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# XML 1.0 forbids most C0 control characters; escape them the way python-pptx's
+# run text setter does (e.g. BEL -> "_x0007_"). Tab and line-feed are legal.
+_CTRL_CHARS_RE = re.compile(r'[\x00-\x08\x0B-\x1F]')
+
+# Read the default template once; each deck is then parsed from memory instead of disk
+_TEMPLATE_PATH = os.path.join(os.path.dirname(pptx.__file__), 'templates', 'default.pptx')
+with open(_TEMPLATE_PATH, 'rb') as _f:
+    _TEMPLATE_BYTES = _f.read()
+
+
+def _write_bullets(text_frame, bullets):
+    """
+    Replace the paragraphs of a text frame with one <a:p><a:r><a:t> per bullet line,
+    writing the XML directly rather than going through the `.text` setter.
+    Like that setter, a newline inside a bullet starts a new paragraph.
+    """
+    lines = [
+        _CTRL_CHARS_RE.sub(lambda m: '_x%04X_' % ord(m.group(0)), line)
+        for bullet in bullets
+        for line in str(bullet).replace('\r\n', '\n').split('\n')
+    ]
+    txBody = text_frame._txBody
+    for p in txBody.findall(qn('a:p')):
+        txBody.remove(p)
+    for line in lines:
+        p = etree.SubElement(txBody, qn('a:p'))
+        r = etree.SubElement(p, qn('a:r'))
+        etree.SubElement(r, qn('a:t')).text = line
+    if not lines:
+        # a txBody must contain at least one paragraph
+        etree.SubElement(txBody, qn('a:p'))
 
 
 def create_ppt(slides):
     """
-    slides: list of dicts like {'title': '...', 'bullets': [...], 'image_path': '/tmp/x.png' or None}
-    Returns path to saved pptx.
+    slides: list of dicts like {'title': '...', 'bullets': [...], 'image_bytes': b'...' or None}
+    Returns the saved pptx as a BytesIO positioned at the start.
     """
-    prs = Presentation()
+    prs = Presentation(io.BytesIO(_TEMPLATE_BYTES))
 
-    for s in slides:
-        # Ensure layout exists; layout 1 typically has title + content. If not, fallback to blank.
-        try:
-            slide_layout = prs.slide_layouts[1]
-        except Exception:
-            slide_layout = prs.slide_layouts[0]
+    # Ensure layout exists; layout 1 typically has title + content. If not, fallback to blank.
+    try:
+        slide_layout = prs.slide_layouts[1]
+    except Exception:
+        slide_layout = prs.slide_layouts[0]
 
+    for s in slides:
         slide = prs.slides.add_slide(slide_layout)
 
         # Some templates may not have a title placeholder in layout 1; guard carefully
@@ -36,12 +70,12 @@ def create_ppt(slides):
             log.debug("No title placeholder on this layout")
 
         # Body placeholder index may vary; attempt to find the first text frame placeholder
-        body_text = "\n".join(s.get('bullets', []))
+        bullets = s.get('bullets', [])
         inserted = False
         for shape in slide.placeholders:
             try:
                 if shape.has_text_frame:
-                    shape.text = body_text
+                    _write_bullets(shape.text_frame, bullets)
                     inserted = True
                     break
             except Exception:
@@ -53,18 +87,18 @@ def create_ppt(slides):
             width = Inches(6)
             height = Inches(3)
             txBox = slide.shapes.add_textbox(left, top, width, height)
-            tf = txBox.text_frame
-            tf.text = body_text
+            _write_bullets(txBox.text_frame, bullets)
 
         # add image if available
-        img_path = s.get('image_path')
-        if img_path:
+        img = s.get('image_bytes')
+        if img:
             try:
                 # place on right side; adjust values for your template
-                slide.shapes.add_picture(img_path, Inches(5), Inches(1.5), width=Inches(4))
+                slide.shapes.add_picture(io.BytesIO(img), Inches(5), Inches(1.5), width=Inches(4))
             except Exception as e:
-                log.exception("Failed to add picture %s: %s", img_path, e)
+                log.exception("Failed to add picture for slide %s: %s", s.get('title', ''), e)
 
-    file_path = os.path.join(OUTPUT_DIR, f"presentation_{uuid.uuid4().hex}.pptx")
-    prs.save(file_path)
-    return file_path
+    buf = io.BytesIO()
+    prs.save(buf)
+    buf.seek(0)
+    return buf